@@ -123,6 +123,7 @@ class Canvas:
         """Resizes the internal viewport"""
         self.width, self.height = width, height
         gl.glViewport(0, 0, self.width, self.height)
+        BaseObject.resetBoundTextures()  # Framebuffer may have been recreated, changing texture bindings
         self.projection.setSize(height, width)
 
     def clearDrawn(self):
@@ -135,6 +136,9 @@ class Canvas:
         if not self.initialized:
             self.initialize()
 
+        # Texture bindings may have been changed outside of the renderer since the last frame
+        BaseObject.resetBoundTextures()
+
         # Clear screen
         self.clearDrawn()
 
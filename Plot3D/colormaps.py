@@ -11,6 +11,9 @@ class Colormap:
     A class for representing and working with colormaps
     """
 
+    # Number of samples uploaded to the GPU when converting to a texture
+    texture_samples: int = 1024
+
     def __init__(self, source_array: np.ndarray):
         """
         Constructor for colormaps
@@ -50,15 +53,26 @@ class Colormap:
         if tex is None or tex == -1:
             tex = gl.glGenTextures(1)
 
-        # Configure texture
+        # Configure texture (remembering the previous binding so renderers' cached bindings stay valid)
+        previous_tex = int(gl.glGetIntegerv(gl.GL_TEXTURE_BINDING_1D))
         gl.glBindTexture(gl.GL_TEXTURE_1D, tex)
         gl.glTexParameterf(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
         gl.glTexParameterf(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
-        gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
-        gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+
+        # Resample colormap to a denser lookup table
+        source_points = np.linspace(0.0, 1.0, len(self.__cmap))
+        sample_points = np.linspace(0.0, 1.0, self.texture_samples)
+        data = np.empty((self.texture_samples, 3), dtype=np.float32)
+        for channel in range(3):
+            data[:, channel] = np.interp(sample_points, source_points, self.__cmap[:, channel])
 
         # Set texture data
-        gl.glTexImage1D(gl.GL_TEXTURE_1D, 0, gl.GL_RGB, 255, 0, gl.GL_RGB, gl.GL_FLOAT, self.__cmap)
+        gl.glTexImage1D(gl.GL_TEXTURE_1D, 0, gl.GL_RGB, len(data), 0, gl.GL_RGB, gl.GL_FLOAT, data)
+
+        # Restore previous binding
+        gl.glBindTexture(gl.GL_TEXTURE_1D, previous_tex)
 
         # Return texture ID
         return tex
@@ -17,6 +17,10 @@ class BaseObject:
 
     __current_projection: np.ndarray = np.identity(4)
 
+    # Textures currently bound to each (texture unit, target) pair, shared by all objects.  Only valid within a frame,
+    # as other code (e.g., Qt) may change bindings between frames; see `resetBoundTextures`
+    __bound_textures: dict = {}
+
     def __init__(self):
         self._initialized: bool = False
 
@@ -125,6 +129,28 @@ class BaseObject:
         # Create buffer objects
         self.createBuffers()
 
+    @staticmethod
+    def bindTexture(unit: int, target: int, tex: int):
+        """
+        Binds a texture to the given texture unit, skipping the call if it is already bound there
+
+        Arguments:
+            unit (int): Index of the texture unit to bind to (e.g., 0 for `GL_TEXTURE0`)
+            target (int): Texture target to bind to (e.g., `GL_TEXTURE_2D`)
+            tex (int): ID of the texture to bind
+        """
+        if BaseObject.__bound_textures.get((unit, target)) == tex:
+            return
+
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(target, tex)
+        BaseObject.__bound_textures[(unit, target)] = tex
+
+    @staticmethod
+    def resetBoundTextures():
+        """Forgets which textures are bound, so the next `bindTexture` call for each unit always binds"""
+        BaseObject.__bound_textures.clear()
+
     @classmethod
     def setProjectionUniform(cls, projection: Projection):
         """Sets the projection uniform to match the provided camera object"""
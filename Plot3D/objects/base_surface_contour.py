@@ -3,7 +3,10 @@ This module contains a class for image-based renderable objects
 """
 # Import modules
 from typing import Tuple
+from functools import lru_cache
 import ctypes
+import math
+import warnings
 import numpy as np
 from .base import BaseObject
 from ..colormaps import Colormap, viridis
@@ -11,6 +14,10 @@ from ..camera import Camera, Projection
 import OpenGL.GL as gl
 
 
+# Largest 3D texture size that OpenGL guarantees support for
+_MAX_GUARANTEED_3D_TEX = 256
+
+
 class BaseCrossSection(BaseObject):
     """Base class for objects that display the values of a 3D array that their model intersects"""
 
@@ -20,6 +27,10 @@ class BaseCrossSection(BaseObject):
 
     __current_projection: np.ndarray = np.identity(4)
 
+    # Vertex array object shared by all cross-sections, as their vertex layouts are identical
+    __shared_vao: int = -1
+    __vertex_stride: int = (3+3) * np.dtype(np.float32).itemsize
+
     def __init__(self, array: np.ndarray, offset: Tuple[float, float, float], x_size: float = None, y_size: float = None, z_size: float = None, vmin: float = None, vmax: float = None, cmap: Colormap = None):
         """
         Arguments:
@@ -41,8 +52,8 @@ class BaseCrossSection(BaseObject):
             raise ValueError(f"Expected a 3D array for 'array' (was {len(array.shape)}-dimensional)")
 
         # Check for danger
-        if max(array.shape) > 256:
-            print("Warning: OpenGL only guarantees up to 256x256x256 3D textures")
+        if max(array.shape) > _MAX_GUARANTEED_3D_TEX:
+            warnings.warn(f"OpenGL only guarantees up to {_MAX_GUARANTEED_3D_TEX}^3 3D textures", RuntimeWarning, stacklevel=2)
 
         # Save attributes
         self.__array: np.ndarray = array
@@ -51,30 +62,35 @@ class BaseCrossSection(BaseObject):
         self.__x_size: float = array.shape[0] if x_size is None else x_size
         self.__y_size: float = array.shape[1] if y_size is None else y_size
         self.__z_size: float = array.shape[2] if z_size is None else z_size
+        self.__effective_radius: float = math.sqrt(self.__x_size**2 + self.__y_size**2 + self.__z_size**2)
 
         self.vmin = np.min(self.array) if vmin is None else vmin
         self.vmax = np.max(self.array) if vmax is None else vmax
 
         # Generate triangles for rendering
-        uvw = self.base_model()
-        positions = uvw - np.array([0.5, 0.5, 0.5]) + self.offset
+        uvw = self.cached_base_model()
+        scales = np.array([self.x_size, self.y_size, self.z_size], dtype=np.float32)
+        positions = (uvw - 0.5 + self.offset.astype(np.float32)) * scales
 
-        self.triangles = np.zeros((len(positions), 6), dtype=np.float32)
-        self.triangles[:, 0] = positions.T[0]*self.x_size
-        self.triangles[:, 1] = positions.T[1]*self.y_size
-        self.triangles[:, 2] = positions.T[2]*self.z_size
-        self.triangles[:, 3] = uvw.T[0]
-        self.triangles[:, 4] = uvw.T[1]
-        self.triangles[:, 5] = uvw.T[2]
+        self.triangles = np.concatenate([positions, uvw], axis=1)
+        self.triangles_count: int = len(self.triangles)
 
         # Vertex buffer attributes
-        self.__vao: int = -1
         self.__vbo: int = -1
+        self.__pbo: int = -1
 
         # Texture attributes
         self.__tex: int = -1
+        self.__tex_bounds: Tuple[float, float] = (0.0, 1.0)
+        self.__tex_dirty: bool = False
+
+        # Normalization buffer reused by texture re-uploads (allocated on the first one)
+        self.__norm_buf: np.ndarray = None
         self.colormap = viridis if cmap is None else cmap
 
+        # Uniform locations (populated on initialization)
+        self.__uniforms: dict = {}
+
     @property
     def x_size(self) -> float:
         return self.__x_size
@@ -89,13 +105,49 @@ class BaseCrossSection(BaseObject):
 
     @staticmethod
     def base_model() -> np.ndarray:
-        """Returns the base model used for the cross-section.  Override in subclass"""
+        """
+        Returns the base model used for the cross-section.  Override in subclass.
+
+        The model must not depend on instance state, as it is only computed once per class (see `cached_base_model`)
+        """
         raise NotImplementedError("Override in subclass")
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def cached_base_model(cls) -> np.ndarray:
+        """Returns a read-only, float32 copy of the base model, computing it only once per class"""
+        model = np.array(cls.base_model(), dtype=np.float32)
+        model.setflags(write=False)
+        return model
+
+    @classmethod
+    def getSharedVertexArray(cls) -> int:
+        """Returns the vertex array object describing the cross-section vertex layout, creating it if necessary"""
+        if BaseCrossSection.__shared_vao != -1:
+            return BaseCrossSection.__shared_vao
+
+        # Configure vertex attributes, sourced from vertex buffer binding 0
+        vao = gl.glGenVertexArrays(1)
+        gl.glBindVertexArray(vao)
+        itemsize = np.dtype(np.float32).itemsize
+
+        # Position (x, y, z)
+        gl.glVertexAttribFormat(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 0)
+        gl.glVertexAttribBinding(0, 0)
+        gl.glEnableVertexAttribArray(0)
+
+        # UVW position (u, v, w)
+        gl.glVertexAttribFormat(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 3*itemsize)
+        gl.glVertexAttribBinding(1, 0)
+        gl.glEnableVertexAttribArray(1)
+
+        BaseCrossSection.__shared_vao = vao
+        return vao
+
     @property
     def effective_radius(self):
         """Effective radius used when focusing on this object"""
-        return np.sqrt(self.x_size**2 + self.y_size**2 + self.z_size**2)
+        return self.__effective_radius
 
     @property
     def array(self) -> np.ndarray:
@@ -103,28 +155,31 @@ class BaseCrossSection(BaseObject):
 
     @array.setter
     def array(self, new_array: np.ndarray):
-        # Enforce type
-        new_array = np.array(new_array).astype(self.__array.dtype)
+        # Enforce type (only copies if a conversion is required)
+        new_array = np.asarray(new_array, dtype=self.__array.dtype)
 
         # Check if shapes match
         # FIXME: It might not be strictly necessary to enforce the same shape...
         if new_array.shape != self.__array.shape:
             raise ValueError(f"Array shape does not match internal array (expected {self.__array.shape}, got {new_array.shape})")
         
-        # Set internal array and update texture if initialized
+        # Set internal array and mark texture for update on the next render
         self.__array = new_array
-        if self.initialized:
-            self.setTexture(self.array)
+        self.__tex_dirty = True
 
 
     @property
     def vao(self) -> int:
-        return self.__vao
+        return BaseCrossSection.__shared_vao
 
     @property
     def vbo(self) -> int:
         return self.__vbo
 
+    @property
+    def pbo(self) -> int:
+        return self.__pbo
+
     @property
     def tex(self) -> int:
         return self.__tex
@@ -146,23 +201,16 @@ class BaseCrossSection(BaseObject):
         // Uniforms
         uniform sampler1D cmap;
         uniform sampler3D field;
-
-        vec3 colormap(float value)
-        {
-            // Clamp to allowed range [0.0-1.0]
-            value = clamp(value, 0.0, 1.0);
-            
-            // Convert value to color using cmap
-            return texture(cmap, value).xyz;
-        }
+        uniform float vmin;
+        uniform float inv_vrange;
 
         void main()
         {
-            // Get value from tex at this position
-            float value = texture(field, FragPos).x;
+            // Get value from tex at this position and remap to colormap bounds
+            float value = (texture(field, FragPos).x - vmin) * inv_vrange;
             
-            // Convert to color using colormap and output
-            FragColor = vec4(colormap(value), 1.0);
+            // Convert to color using colormap and output (clamp folds into the preceding multiply-add as a saturate)
+            FragColor = vec4(texture(cmap, clamp(value, 0.0, 1.0)).xyz, 1.0);
         }
         """
 
@@ -194,7 +242,10 @@ class BaseCrossSection(BaseObject):
         """
         # Bind and set buffer to triangle data
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
-        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.triangles.size*self.triangles.itemsize, self.triangles.flatten(), gl.GL_STATIC_DRAW)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.triangles.nbytes, self.triangles.ravel(), gl.GL_STATIC_DRAW)
+
+        # Triangle data is never read back on the CPU, so release it once uploaded
+        self.triangles = None
 
     def createTexture(self):
         """
@@ -202,11 +253,22 @@ class BaseCrossSection(BaseObject):
         """
         if self.tex is None or self.tex == -1:
             self.__tex = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_3D, self.tex)
+        self.bindTexture(1, gl.GL_TEXTURE_3D, self.tex)
+
+        # Allocate immutable storage once; the array setter guarantees the shape never changes
+        height, width, depth = self.array.shape
+        gl.glTexStorage3D(gl.GL_TEXTURE_3D, 1, gl.GL_R16, width, height, depth)
+
+        # Configure sampling (after allocation)
         gl.glTexParameterf(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
         gl.glTexParameterf(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
-        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
-        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameterf(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_WRAP_R, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_3D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+
+        # Uploads are tightly packed uint16 rows, so only 2-byte alignment can be guaranteed
+        # (row length and image height are left at 0, meaning tightly packed)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, np.dtype(np.uint16).itemsize)
 
     def setTexture(self, array: np.ndarray):
         """
@@ -216,11 +278,36 @@ class BaseCrossSection(BaseObject):
         if self.tex is None or self.tex == -1:
             self.createTexture()
 
-        # Set texture data
-        data = ((np.array(array)-self.vmin)/(self.vmax-self.vmin)).flatten().astype(np.float32)
+        # Quantize to 16-bit values spanning the current colormap bounds.  Values outside of them saturate, so the
+        # texture must be re-quantized if the bounds are later widened (see `render`)
+        self.__tex_bounds = (float(self.vmin), float(self.vmax))
+        vrange = (self.vmax - self.vmin) or 1.0  # Avoid dividing by zero for a degenerate colormap range
+        # (the first upload uses a temporary buffer, which is only kept once the texture is re-uploaded)
+        norm = self.__norm_buf
+        if norm is None:
+            norm = np.empty(array.shape, dtype=np.float32)
+            if self.initialized:
+                self.__norm_buf = norm
+        np.subtract(array, self.vmin, out=norm)
+        np.multiply(norm, 65535.0/vrange, out=norm)
+        np.clip(norm, 0.0, 65535.0, out=norm)
+        np.rint(norm, out=norm)
         height, width, depth = array.shape
-        gl.glBindTexture(gl.GL_TEXTURE_3D, self.tex)
-        gl.glTexImage3D(gl.GL_TEXTURE_3D, 0, gl.GL_R32F, width, height, depth, 0, gl.GL_RED, gl.GL_FLOAT, data)
+
+        # Write quantized values straight into the (orphaned) pixel buffer, so the texture copy is performed
+        # asynchronously by the driver
+        nbytes = array.size * np.dtype(np.uint16).itemsize
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, self.pbo)
+        gl.glBufferData(gl.GL_PIXEL_UNPACK_BUFFER, nbytes, None, gl.GL_STREAM_DRAW)
+        ptr = gl.glMapBufferRange(gl.GL_PIXEL_UNPACK_BUFFER, 0, nbytes, gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT)
+        data = np.ctypeslib.as_array(ctypes.cast(ptr, ctypes.POINTER(ctypes.c_uint16)), shape=array.shape)
+        np.copyto(data, norm, casting='unsafe')
+        gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+
+        # Copy from pixel buffer into texture, then release the pixel buffer so other uploads read from client memory
+        self.bindTexture(1, gl.GL_TEXTURE_3D, self.tex)
+        gl.glTexSubImage3D(gl.GL_TEXTURE_3D, 0, 0, 0, 0, width, height, depth, gl.GL_RED, gl.GL_UNSIGNED_SHORT, None)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
 
     def initialize(self):
         """Initializes the object/class in OpenGL if it isn't already"""
@@ -234,12 +321,15 @@ class BaseCrossSection(BaseObject):
         self.createBuffers()
         self.setBuffers()
         self.setTexture(self.array)
+        self.__tex_dirty = False
+
+        # Cache uniform locations so they aren't looked up every frame
+        for name in ("cmap", "field", "projection", "view", "vmin", "inv_vrange"):
+            self.__uniforms[name] = gl.glGetUniformLocation(self.shader_program, name)
 
         # Set texture locations
-        cmap_loc = gl.glGetUniformLocation(self.shader_program, "cmap")
-        tex_loc = gl.glGetUniformLocation(self.shader_program, "field")
-        gl.glUniform1i(cmap_loc, 0)
-        gl.glUniform1i(tex_loc, 1)
+        gl.glUniform1i(self.__uniforms["cmap"], 0)
+        gl.glUniform1i(self.__uniforms["field"], 1)
 
         # Mark as initialized
         self._initialized = True
@@ -247,34 +337,42 @@ class BaseCrossSection(BaseObject):
     def createBuffers(self):
         """Creates the internal buffer objects used in the shader"""
         # Destroy existing buffers (if there are any)
-        if self.vao != -1:
-            gl.glDeleteVertexArrays(self.vao)
-            self.__vao = -1
         if self.vbo != -1:
             gl.glDeleteBuffers(self.vbo)
             self.__vbo = -1
+        if self.pbo != -1:
+            gl.glDeleteBuffers(self.pbo)
+            self.__pbo = -1
 
-        # Create vertex objects
-        self.__vao = gl.glGenVertexArrays(1)
+        # Create vertex objects (the vertex layout is shared by all cross-sections)
+        self.getSharedVertexArray()
         self.__vbo = gl.glGenBuffers(1)
 
+        # Create pixel buffer used to stage texture uploads
+        self.__pbo = gl.glGenBuffers(1)
+
         # Set blank mesh
         blank_mesh = np.zeros(6, dtype=np.float32)
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
         gl.glBufferData(gl.GL_ARRAY_BUFFER, 0, blank_mesh, gl.GL_STATIC_DRAW)
 
-        # Configure vertex attributes
-        gl.glBindVertexArray(self.vao)
-        buffer_offset = ctypes.c_void_p
-        stride = (3+3) * blank_mesh.itemsize
+    def setProjectionUniform(self, projection: Projection):
+        """Sets the projection uniform to match the provided camera object"""
+        matrix = projection.matrix
+        # Don't bother if the projection hasn't changed (shared by all objects using this shader)
+        if np.all(matrix == type(self).__current_projection):
+            return
 
-        # Position (x, y, z)
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, None)
-        gl.glEnableVertexAttribArray(0)
+        type(self).__current_projection = matrix
+        loc = self.__uniforms["projection"]
+        if loc != -1:
+            gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, matrix.flatten())
 
-        # UVW position (u, v, w)
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, buffer_offset(3*blank_mesh.itemsize))
-        gl.glEnableVertexAttribArray(1)
+    def setCameraUniform(self, camera: Camera):
+        """Sets the camera uniform to match the provided camera object"""
+        loc = self.__uniforms["view"]
+        if loc != -1:
+            gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, camera.matrix.flatten())
 
     def render(self, camera: Camera, projection: Projection):
         """
@@ -287,18 +385,26 @@ class BaseCrossSection(BaseObject):
         # Use shader and set camera/projection uniforms
         super().render(camera, projection)
 
+        # Upload the latest array if it has changed (at most once per frame), or re-quantize it if the colormap
+        # bounds were widened past those the texture was quantized with (the data beyond them is saturated)
+        tex_min, tex_max = self.__tex_bounds
+        if self.__tex_dirty or self.vmin < tex_min or self.vmax > tex_max:
+            self.setTexture(self.array)
+            self.__tex_dirty = False
+            tex_min, tex_max = self.__tex_bounds
+
+        # Set colormap bounds, relative to the bounds the texture was quantized with (avoiding zero-width ranges)
+        tex_range = (tex_max - tex_min) or 1.0
+        vrange = (self.vmax - self.vmin) or 1.0
+        gl.glUniform1f(self.__uniforms["vmin"], (self.vmin - tex_min)/tex_range)
+        gl.glUniform1f(self.__uniforms["inv_vrange"], tex_range/vrange)
+
         # Bind appropriate buffers
-        gl.glActiveTexture(gl.GL_TEXTURE0)
-        gl.glBindTexture(gl.GL_TEXTURE_1D, self.cmap_tex)
-        gl.glActiveTexture(gl.GL_TEXTURE1)
-        gl.glBindTexture(gl.GL_TEXTURE_3D, self.tex)
+        self.bindTexture(0, gl.GL_TEXTURE_1D, self.cmap_tex)
+        self.bindTexture(1, gl.GL_TEXTURE_3D, self.tex)
 
         gl.glBindVertexArray(self.vao)
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBindVertexBuffer(0, self.vbo, 0, self.__vertex_stride)
 
         # Draw triangles
-        # data = np.zeros(5, dtype=np.float32)
-        # gl.glGetBufferSubData(gl.GL_ARRAY_BUFFER, 0, 5, data)
-        # data = gl.glGetBufferSubData(gl.GL_ARRAY_BUFFER, 0, 20*6)
-        # print(data.view(np.float32).reshape(-1, 5))
-        gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(self.triangles))
+        gl.glDrawArrays(gl.GL_TRIANGLES, 0, self.triangles_count)
@@ -205,7 +205,7 @@ class ImageObject(BaseObject):
         """
         if self.tex is None or self.tex == -1:
             self.__tex = gl.glGenTextures(1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.tex)
+        self.bindTexture(1, gl.GL_TEXTURE_2D, self.tex)
         gl.glTexParameterf(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
         gl.glTexParameterf(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
         gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
@@ -220,9 +220,10 @@ class ImageObject(BaseObject):
             self.createTexture()
 
         # Set texture data
-        data = ((np.array(array)-self.vmin)/(self.vmax-self.vmin)).flatten().astype(np.float32)
+        data = np.subtract(array, self.vmin, dtype=np.float32)
+        data *= 1.0/((self.vmax-self.vmin) or 1.0)  # Avoid dividing by zero for a degenerate colormap range
         height, width = array.shape
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.tex)
+        self.bindTexture(1, gl.GL_TEXTURE_2D, self.tex)
         gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_R32F, width, height, 0, gl.GL_RED, gl.GL_FLOAT, data)
 
     def initialize(self):
@@ -291,17 +292,10 @@ class ImageObject(BaseObject):
         super().render(camera, projection)
 
         # Bind appropriate buffers
-        gl.glActiveTexture(gl.GL_TEXTURE0)
-        gl.glBindTexture(gl.GL_TEXTURE_1D, self.cmap_tex)
-        gl.glActiveTexture(gl.GL_TEXTURE1)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.tex)
+        self.bindTexture(0, gl.GL_TEXTURE_1D, self.cmap_tex)
+        self.bindTexture(1, gl.GL_TEXTURE_2D, self.tex)
 
         gl.glBindVertexArray(self.vao)
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 
         # Draw triangles
-        # data = np.zeros(5, dtype=np.float32)
-        # gl.glGetBufferSubData(gl.GL_ARRAY_BUFFER, 0, 5, data)
-        # data = gl.glGetBufferSubData(gl.GL_ARRAY_BUFFER, 0, 20*6)
-        # print(data.view(np.float32).reshape(-1, 5))
         gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(self.triangles))